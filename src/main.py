@@ -1,77 +1,215 @@
+import os
 import sys
+import glob
+import json
+import shutil
+import bisect
+import functools
+import hashlib
+import tempfile
+import subprocess
 import numpy as np
-import sounddevice as sd
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton,
     QFileDialog, QTextEdit, QLabel, QHBoxLayout, QFrame, QSizePolicy, QCheckBox
 )
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QObject, QThread, QStandardPaths, pyqtSignal
 from PyQt5.QtGui import QIcon
-from pydub import AudioSegment
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.lines import Line2D
-from matplotlib.patches import Rectangle
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import to_rgba
 import arabic_reshaper
 from bidi.algorithm import get_display
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Decoded PCM is cached so reopening a file skips ffmpeg; the least
+# recently opened files are evicted once the cache outgrows this many bytes
+PCM_CACHE_BUDGET = 2 * 1024 ** 3
+
+# Let Agg drop sub-pixel vertices of the dense waveform path while stroking
+plt.rcParams['path.simplify'] = True
+plt.rcParams['path.simplify_threshold'] = 1.0
+
+class MarkerLayer:
+    """Draws the lines and grab boxes of all markers as two collections"""
+    def __init__(self, ax):
+        self.ax = ax
+        # Rows live in buffers with spare capacity; the public arrays are
+        # views of the first `count` rows
+        self.count = 0
+        self._segments = np.empty((0, 2, 2))
+        self._box_verts = np.empty((0, 4, 2))
+        self._colors = np.empty((0, 4))
+        self._set_count(0)
+        self.lines = LineCollection([], linewidths=1.5, animated=True)
+        self.boxes = PolyCollection([], facecolors='lightblue', edgecolors='blue', animated=True)
+        ax.add_collection(self.lines, autolim=False)
+        ax.add_collection(self.boxes, autolim=False)
+        # A slot being dragged is moved into its own collections, so each
+        # drag frame only has to redraw that one marker
+        self.lifted = None
+        self.lifted_lines = LineCollection([], linewidths=1.5, animated=True)
+        self.lifted_boxes = PolyCollection([], facecolors='lightblue', edgecolors='blue', animated=True)
+        ax.add_collection(self.lifted_lines, autolim=False)
+        ax.add_collection(self.lifted_boxes, autolim=False)
+
+    def _set_count(self, count):
+        self.count = count
+        self.segments = self._segments[:count]
+        self.box_verts = self._box_verts[:count]
+        self.colors = self._colors[:count]
+
+    def add(self, x, y_min, y_max, box_y, box_size, sync=True):
+        """Append one marker's geometry and return its slot
+
+        Pass sync=False when adding many markers and call sync() once after.
+        """
+        slot = self.count
+        if slot == len(self._segments):
+            # Grow geometrically so a run of adds stays linear overall
+            capacity = max(16, 2 * slot)
+            self._segments = grow_rows(self._segments, capacity)
+            self._box_verts = grow_rows(self._box_verts, capacity)
+            self._colors = grow_rows(self._colors, capacity)
+        self._segments[slot] = [[x, y_min], [x, y_max]]
+        self._box_verts[slot] = [[x - box_size, box_y], [x + box_size, box_y],
+                                 [x + box_size, box_y + box_size], [x - box_size, box_y + box_size]]
+        self._colors[slot] = to_rgba('green')
+        self._set_count(slot + 1)
+        if sync:
+            self.sync()
+        return slot
+
+    def move(self, slot, x):
+        self.box_verts[slot, :, 0] += x - self.segments[slot, 0, 0]
+        self.segments[slot, :, 0] = x
+        if slot == self.lifted:
+            self.lifted_lines.set_segments(self.segments[slot:slot + 1])
+            self.lifted_boxes.set_verts(self.box_verts[slot:slot + 1])
+        else:
+            self.sync()
+
+    def set_color(self, slot, color):
+        self.colors[slot] = to_rgba(color)
+        self.sync()
+
+    def lift(self, slot):
+        self.lifted = slot
+        self.sync()
+
+    def drop(self):
+        self.lifted = None
+        self.sync()
+
+    def clear(self):
+        self._set_count(0)
+        self.lifted = None
+        self.sync()
+
+    def sync(self):
+        if self.lifted is None:
+            rest = slice(None)
+            lifted = slice(0, 0)
+        else:
+            rest = np.arange(len(self.segments)) != self.lifted
+            lifted = slice(self.lifted, self.lifted + 1)
+        self.lines.set_segments(self.segments[rest])
+        self.lines.set_color(self.colors[rest])
+        self.boxes.set_verts(self.box_verts[rest])
+        self.lifted_lines.set_segments(self.segments[lifted])
+        self.lifted_lines.set_color(self.colors[lifted])
+        self.lifted_boxes.set_verts(self.box_verts[lifted])
+
+    def draw(self):
+        self.ax.draw_artist(self.lines)
+        self.ax.draw_artist(self.boxes)
+
+    def draw_lifted(self):
+        self.ax.draw_artist(self.lifted_lines)
+        self.ax.draw_artist(self.lifted_boxes)
+
 class Marker:
-    def __init__(self, index, word, x, y_min, y_max, ax):
+    def __init__(self, index, word, x, y_min, y_max, layer, sync=True):
         self.index = index
         self.word = word
         self.x = x
-        self.ax = ax
+        self.layer = layer
+        self.ax = layer.ax
         self.selected = False
 
-        # Vertical line across waveform
-        self.line = Line2D([x, x], [y_min, y_max], color='green', linewidth=1.5)
-        ax.add_line(self.line)
-
         # Box for grabbing (below waveform)
         box_size = (y_max - y_min) * 0.05
         self.box_y = y_min - box_size * 2   # place a bit lower
         self.box_size = box_size
 
-        self.box = Rectangle(
-            (x - box_size, self.box_y),
-            box_size * 2, box_size,
-            facecolor='lightblue', edgecolor='blue'
-        )
-        ax.add_patch(self.box)
+        # Vertical line and box are rows in the shared layer
+        self.slot = layer.add(x, y_min, y_max, self.box_y, box_size, sync=sync)
 
         # Text label inside the box (vertical)
-        bidi_text = persian_text(word)
-        self.label = ax.text(
+        self.bidi_word = persian_text(word)
+        self.label = self.ax.text(
             x, self.box_y + box_size / 2,
-            f"{bidi_text}:{index}",
+            f"{self.bidi_word}:{index}",
             ha="center", va="center",
-            fontsize=8, color="black", rotation=90
+            fontsize=8, color="black", rotation=90, animated=True
         )
 
         self.drag_active = False
 
     def update_position(self, x):
         self.x = x
-        self.line.set_xdata([x, x])
-        self.box.set_x(x - self.box_size)
+        self.layer.move(self.slot, x)
         self.label.set_x(x)
 
+    def draw(self):
+        self.ax.draw_artist(self.label)
+
     def set_selected(self, selected: bool):
         self.selected = selected
         if selected:
-            self.line.set_color("blue")
+            self.layer.set_color(self.slot, "blue")
         else:
-            self.line.set_color("green")
-        self.ax.figure.canvas.draw_idle()
+            self.layer.set_color(self.slot, "green")
+
+class DecodeWorker(QObject):
+    """Decodes an MP3 and builds its display pyramid off the GUI thread"""
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, file_path):
+        super().__init__()
+        self.file_path = file_path
 
-    def set_visibility(self, visible):
-        self.line.set_visible(visible)
-        self.box.set_visible(visible)
-        self.label.set_visible(visible)
-        self.ax.figure.canvas.draw_idle()
+    def run(self):
+        try:
+            pcm, sample_rate = load_pcm(self.file_path)
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            self.failed.emit(str(e))
+            return
+        if pcm.size == 0:
+            self.failed.emit("no audio samples in " + self.file_path)
+            return
+        # Samples stay int16 for both drawing and playback; peak
+        # normalization is applied as a gain while filling audio blocks
+        samples = np.asarray(pcm)
+        lo, hi = (int(v) for v in extrema(samples))
+        gain = 32767.0 / max(hi, -lo, 1)
+        pyramid = build_minmax_pyramid(samples)
+        # Compile the playback kernel here rather than in the first audio callback
+        fill_output(samples, np.zeros((1, 1), dtype=np.int16), 0, 1, gain)
+        self.finished.emit((samples, sample_rate, pyramid, gain, lo, hi))
 
 class WaveformViewer(QMainWindow):
+    # Emitted from the PortAudio thread; the queued slot runs on the GUI thread
+    playback_done = pyqtSignal(object)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("MP3 Waveform Viewer with Markers")
@@ -131,6 +269,12 @@ class WaveformViewer(QMainWindow):
         self.ax.spines['right'].set_visible(False)
         self.ax.spines['bottom'].set_visible(False)
         self.ax.spines['left'].set_visible(False)
+        # Persistent waveform artist, updated in place via set_data.
+        # Data artists are animated: they are excluded from full draws and
+        # painted on top of a cached background instead (see blit()).
+        self.line, = self.ax.plot([], [], color='#4CAF50', linewidth=1.2, animated=True,
+                                  antialiased=False)
+        self.marker_layer = MarkerLayer(self.ax)
 
         # Playback controls
         self.playback_controls = QWidget()
@@ -219,17 +363,34 @@ class WaveformViewer(QMainWindow):
         self.layout.addWidget(self.export_button, alignment=Qt.AlignRight)
 
         # State
-        self.audio = None
         self.samples = None
+        self.playback_gain = 1.0
+        self.pyramid = []
+        self._time_ramp = np.empty(0)
+        self._dec_time = np.empty(0)
+        self._dec_samples = np.empty(0, dtype=np.float32)
+        # Pyramid level and ms range currently loaded into self.line
+        self._plot_level = None
+        self._plot_span = (0.0, 0.0)
         self.sample_rate = None
+        self.duration_ms = 0.0
+        self.samples_per_ms = None
+        self.ms_per_sample = None
         self.y_min = None
         self.y_max = None
-        self.line = None
         self.playhead_line = None
         self.markers = []
+        # Markers ordered by x (self.markers keeps word order), for lookups
+        self._sorted_xs = []
+        self._sorted_markers = []
+        self._drag_start_x = None
+        self._bg = None
+        self._scene_bg = None
+        self._drag_bg = None
         self._drag_marker = None
         self._drag_active = False
         self._last_xdata = None
+        self._canvas_width = max(1, self.canvas.width())
         self.selected_marker = None
         self.add_markers_on_keypress = False 
         self.next_marker_index = 0
@@ -240,14 +401,37 @@ class WaveformViewer(QMainWindow):
         self.canvas.mpl_connect("button_press_event", self.on_press)
         self.canvas.mpl_connect("button_release_event", self.on_release)
         self.canvas.mpl_connect("motion_notify_event", self.on_motion)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        self.canvas.mpl_connect("resize_event", self.on_resize)
+        # Every xlim write resamples the waveform; handlers only set limits
+        self.ax.callbacks.connect("xlim_changed", lambda ax: self.schedule_waveform_update())
 
         # Playback
         self.stream = None
         self.playback_position = 0
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_playback_and_ui)
+        self.playback_done.connect(self.playback_finished)
+
+        # Clears markers once typing pauses instead of on every keystroke
+        self.transcription_timer = QTimer(self)
+        self.transcription_timer.setSingleShot(True)
+        self.transcription_timer.setInterval(400)
+        self.transcription_timer.timeout.connect(self.clear_stale_markers)
+        self.marker_text = None
+
+        # Background decoding
+        self.decode_thread = None
+        self.decode_worker = None
+
+        # Coalesces bursts of scroll/pan events into one redraw per frame
+        self.redraw_timer = QTimer(self)
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.timeout.connect(self.flush_waveform_update)
+        self._waveform_dirty = False
 
         self.current_word_label = None
+        self.displayed_word = ""
         try:
             self.vazir_font = fm.FontProperties(fname="fonts/vazir_medium.ttf")
         except FileNotFoundError:
@@ -265,18 +449,33 @@ class WaveformViewer(QMainWindow):
         file_path, _ = QFileDialog.getOpenFileName(self, "Select MP3", "", "MP3 Files (*.mp3)")
         if not file_path:
             return
-        self.audio = AudioSegment.from_mp3(file_path)
-        self.samples = np.array(self.audio.get_array_of_samples(), dtype=np.float32)
-        if self.audio.channels == 2:
-            self.samples = self.samples.reshape((-1, 2)).mean(axis=1)
-        self.samples /= np.max(np.abs(self.samples))
-        self.sample_rate = self.audio.frame_rate
-        self.y_min, self.y_max = float(np.min(self.samples)), float(np.max(self.samples))
-        self.y_min *= 1.1
-        self.y_max *= 1.1
-        duration_ms = len(self.samples) / self.sample_rate * 1000
-        self.ax.set_xlim(0, duration_ms)
-        self.update_waveform()
+        self.load_button.setDisabled(True)
+        self.load_button.setText("Loading...")
+        self.decode_thread = QThread(self)
+        self.decode_worker = DecodeWorker(file_path)
+        self.decode_worker.moveToThread(self.decode_thread)
+        self.decode_thread.started.connect(self.decode_worker.run)
+        self.decode_worker.finished.connect(self.on_audio_decoded)
+        self.decode_worker.failed.connect(self.on_audio_failed)
+        self.decode_worker.finished.connect(self.decode_thread.quit)
+        self.decode_worker.failed.connect(self.decode_thread.quit)
+        # Both are freed by the thread's own finished signal, once run() has returned
+        self.decode_thread.finished.connect(self.decode_worker.deleteLater)
+        self.decode_thread.finished.connect(self.decode_thread.deleteLater)
+        self.decode_thread.finished.connect(self.on_decode_thread_finished)
+        self.decode_thread.start()
+
+    def on_audio_decoded(self, result):
+        self.stop_playback()
+        self.samples, self.sample_rate, self.pyramid, self.playback_gain, y_min, y_max = result
+        self.samples_per_ms = self.sample_rate / 1000
+        self.ms_per_sample = 1000 / self.sample_rate
+        self.y_min = y_min * 1.1
+        self.y_max = y_max * 1.1
+        self.duration_ms = len(self.samples) * self.ms_per_sample
+        self._plot_level = None
+        self.ax.set_ylim(self.y_min, self.y_max)
+        self.ax.set_xlim(0, self.duration_ms)
         self.clear_markers()
         self.transcription.clear()
         self.transcription.setDisabled(False)
@@ -284,12 +483,32 @@ class WaveformViewer(QMainWindow):
         self.add_markers_checkbox.setDisabled(False)
         self.update_playback_ui()
 
+    def on_audio_failed(self, message):
+        print("Could not decode audio:", message)
+
+    def on_decode_thread_finished(self):
+        self.decode_worker = None
+        self.decode_thread = None
+        self.load_button.setDisabled(False)
+        self.load_button.setText("Load MP3")
+
+    def closeEvent(self, event):
+        # Qt aborts if a running QThread is destroyed with the window, so
+        # let an in-flight decode finish before closing
+        if self.decode_thread is not None:
+            self.decode_thread.quit()
+            self.decode_thread.wait()
+        super().closeEvent(event)
+
     def clear_markers(self):
         for m in self.markers:
-            m.line.remove()
-            m.box.remove()
             m.label.remove()
         self.markers.clear()
+        self.marker_layer.clear()
+        self._drag_marker = None
+        self._drag_bg = None
+        self._sorted_xs.clear()
+        self._sorted_markers.clear()
         self.selected_marker = None
         if self.playhead_line:
             self.playhead_line.remove()
@@ -313,26 +532,135 @@ class WaveformViewer(QMainWindow):
         if self.samples is None:
             return
         x_min, x_max = self.ax.get_xlim()
-        total_ms = len(self.samples) / self.sample_rate * 1000
         x_min = max(0, x_min)
-        x_max = min(total_ms, x_max)
-        start_idx = int(x_min / 1000 * self.sample_rate)
-        end_idx = int(x_max / 1000 * self.sample_rate)
+        x_max = min(self.duration_ms, x_max)
+        samples_per_ms = self.samples_per_ms
+        start_idx = int(x_min * samples_per_ms)
+        end_idx = int(x_max * samples_per_ms)
         if end_idx <= start_idx:
             return
         visible_samples = end_idx - start_idx
-        canvas_width = max(1, self.canvas.width())
-        step = max(1, int(visible_samples / (2 * canvas_width)))
-        dec_samples = self.samples[start_idx:end_idx:step]
-        dec_time = np.linspace(x_min, x_max, num=len(dec_samples))
-
-        if self.line is None:
-            self.line, = self.ax.plot(dec_time, dec_samples, color='#4CAF50', linewidth=1.2)
-            self.ax.set_ylim(self.y_min, self.y_max)
+
+        # Pick the coarsest pyramid level that still has a block per pixel
+        level = int(np.log2(max(1, visible_samples / self._canvas_width)))
+        level = min(level, len(self.pyramid) - 1)
+
+        # Panning within the loaded span at the same level needs no new data
+        span_min, span_max = self._plot_span
+        if level == self._plot_level and span_min <= x_min and x_max <= span_max:
+            self.blit()
+            return
+
+        # Load a view width of margin on both sides so pans can reuse it
+        start_idx = max(0, start_idx - visible_samples)
+        end_idx = min(len(self.samples), end_idx + visible_samples)
+        self._plot_level = level
+        self._plot_span = (start_idx * self.ms_per_sample, end_idx * self.ms_per_sample)
+        lo, hi = start_idx >> level, (end_idx >> level) + 1
+        mins, maxs = self.pyramid[level]
+        mins, maxs = mins[lo:hi], maxs[lo:hi]
+        n = len(mins)
+        count = n if level == 0 else 2 * n
+
+        # Reuse the plot buffers across redraws; grow them only when needed
+        if len(self._dec_time) < count:
+            self._time_ramp = np.arange(2 * count, dtype=np.float64)
+            self._dec_time = np.empty(2 * count, dtype=np.float64)
+            self._dec_samples = np.empty(2 * count, dtype=np.float32)
+        dec_time = self._dec_time[:count]
+        if level == 0:
+            dec_samples = mins
+            block_time = dec_time
         else:
-            self.line.set_data(dec_time, dec_samples)
-            self.ax.set_xlim(x_min, x_max)
-        self.canvas.draw_idle()
+            # Interleave min/max so each block draws as a vertical stroke
+            dec_samples = self._dec_samples[:count]
+            dec_samples[0::2] = mins
+            dec_samples[1::2] = maxs
+            block_time = dec_time[0::2]
+        np.add(self._time_ramp[:n], lo, out=block_time)
+        block_time *= (1 << level) * self.ms_per_sample
+        if level > 0:
+            dec_time[1::2] = block_time
+
+        self.line.set_data(dec_time, dec_samples)
+        self.blit()
+
+    def schedule_waveform_update(self):
+        # Leading-edge throttle: draw right away, then at most once per
+        # frame while events keep arriving
+        if self.redraw_timer.isActive():
+            self._waveform_dirty = True
+        else:
+            self.update_waveform()
+            self.redraw_timer.start(16)
+
+    def flush_waveform_update(self):
+        if self._waveform_dirty:
+            self._waveform_dirty = False
+            self.update_waveform()
+            self.redraw_timer.start(16)
+
+    def on_resize(self, event):
+        # Cached so pans and zooms don't query the widget on every redraw
+        self._canvas_width = max(1, self.canvas.width())
+
+    # -------------------------
+    # Blitting
+    # -------------------------
+    def on_draw(self, event):
+        # A full draw only renders the static axes; cache it as background
+        self._bg = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_scene()
+        self.draw_overlay()
+
+    def draw_scene(self):
+        self.ax.draw_artist(self.line)
+        self.marker_layer.draw()
+        for m in self.markers:
+            if m is not self._drag_marker:
+                m.draw()
+        if self._drag_marker is not None:
+            # Everything but the dragged marker, so drag frames redraw only it
+            self._drag_bg = self.canvas.copy_from_bbox(self.figure.bbox)
+            self.marker_layer.draw_lifted()
+            self._drag_marker.draw()
+        # Waveform + markers, so playback ticks only redraw the overlay
+        self._scene_bg = self.canvas.copy_from_bbox(self.figure.bbox)
+
+    def draw_overlay(self):
+        if self.playhead_line:
+            self.ax.draw_artist(self.playhead_line)
+        if self.current_word_label:
+            self.ax.draw_artist(self.current_word_label)
+
+    def blit(self):
+        if self._bg is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._bg)
+        self.draw_scene()
+        self.draw_overlay()
+        self.canvas.blit(self.figure.bbox)
+
+    def blit_drag(self):
+        if self._drag_bg is None:
+            self.blit()
+            return
+        self.canvas.restore_region(self._drag_bg)
+        self.marker_layer.draw_lifted()
+        self._drag_marker.draw()
+        # The scene layer is stale while dragging; overlay ticks fall back to blit()
+        self._scene_bg = None
+        self.draw_overlay()
+        self.canvas.blit(self.figure.bbox)
+
+    def blit_overlay(self):
+        if self._scene_bg is None:
+            self.blit()
+            return
+        self.canvas.restore_region(self._scene_bg)
+        self.draw_overlay()
+        self.canvas.blit(self.figure.bbox)
 
     # -------------------------
     # Scroll zoom
@@ -345,11 +673,12 @@ class WaveformViewer(QMainWindow):
         scale_factor = 0.8 if event.button == "up" else 1.25
         new_x_min = x_mid - (x_mid - x_min) * scale_factor
         new_x_max = x_mid + (x_max - x_mid) * scale_factor
-        total_ms = len(self.samples) / self.sample_rate * 1000
         new_x_min = max(0, new_x_min)
-        new_x_max = min(total_ms, new_x_max)
+        new_x_max = min(self.duration_ms, new_x_max)
+        # Zooming out past the full view clamps to the same limits
+        if (new_x_min, new_x_max) == (x_min, x_max):
+            return
         self.ax.set_xlim(new_x_min, new_x_max)
-        self.update_waveform()
 
     # -------------------------
     # Drag markers & pan
@@ -357,20 +686,30 @@ class WaveformViewer(QMainWindow):
     def on_press(self, event):
         if self.samples is None or event.xdata is None:
             return
-        # Check marker grab
-        for m in self.markers:
-            if abs(event.xdata - m.x) < 20 and m.line.get_visible():
-                self._drag_marker = m
-                m.drag_active = True
-                self.select_marker(m)
-                return
+        # Check marker grab within a few pixels, whatever the zoom level
+        x_min, x_max = self.ax.get_xlim()
+        m = self.marker_near(event.xdata, 8 * (x_max - x_min) / self._canvas_width)
+        if m is not None:
+            self._drag_marker = m
+            self._drag_start_x = m.x
+            m.drag_active = True
+            self.select_marker(m)
+            self.marker_layer.lift(m.slot)
+            self.blit()
+            return
         self._drag_active = True
         self._last_xdata = event.xdata
 
     def on_release(self, event):
         if self._drag_marker:
             self._drag_marker.drag_active = False
+            # Re-sort once per drag rather than on every motion event
+            self.unindex_marker(self._drag_marker, self._drag_start_x)
+            self.index_marker(self._drag_marker)
+            self.marker_layer.drop()
             self._drag_marker = None
+            self._drag_bg = None
+            self.blit()
         self._drag_active = False
         self._last_xdata = None
 
@@ -380,22 +719,27 @@ class WaveformViewer(QMainWindow):
         # Drag marker
         if self._drag_marker and self._drag_marker.drag_active:
             self._drag_marker.update_position(event.xdata)
-            self.canvas.draw_idle()
+            self.blit_drag()
             return
         # Pan waveform
         if self._drag_active:
             dx = self._last_xdata - event.xdata
             x_min, x_max = self.ax.get_xlim()
-            total_ms = len(self.samples) / self.sample_rate * 1000
+            # Ignore sub-pixel moves; _last_xdata is kept so they accumulate
+            if abs(dx) * self._canvas_width < x_max - x_min:
+                return
             new_x_min = max(0, x_min + dx)
-            new_x_max = min(total_ms, x_max + dx)
-            self.ax.set_xlim(new_x_min, new_x_max)
-            self.update_waveform()
+            new_x_max = min(self.duration_ms, x_max + dx)
             self._last_xdata = event.xdata
+            # Dragging against an edge that is already reached changes nothing
+            if (new_x_min, new_x_max) == (x_min, x_max):
+                return
+            self.ax.set_xlim(new_x_min, new_x_max)
 
     def select_marker(self, marker: Marker):
-        for m in self.markers:
-            m.set_selected(False)
+        # Only one marker is ever selected; callers redraw once afterwards
+        if self.selected_marker is not None:
+            self.selected_marker.set_selected(False)
         marker.set_selected(True)
         self.selected_marker = marker
 
@@ -428,14 +772,18 @@ class WaveformViewer(QMainWindow):
             else:
                 start_ms = 0
 
-        self.playback_position = int(start_ms / 1000 * self.sample_rate)
+        self.playback_position = int(start_ms * self.samples_per_ms)
         
-        self.stream = sd.OutputStream(
-            samplerate=int(self.sample_rate * self.playback_speed), channels=1, dtype='float32',
-            callback=self.sd_callback, finished_callback=self.playback_finished
+        # PortAudio is only brought up once playback is first used
+        import sounddevice as sd
+        stream = sd.OutputStream(
+            samplerate=int(self.sample_rate * self.playback_speed), channels=1, dtype='int16',
+            callback=self.sd_callback, finished_callback=lambda: self.playback_done.emit(stream)
         )
+        self.stream = stream
         self.stream.start()
-        self.timer.start(10)
+        # ~30 fps is plenty for a moving playhead
+        self.timer.start(33)
         self.update_playback_ui()
 
     def stop_playback(self):
@@ -444,24 +792,25 @@ class WaveformViewer(QMainWindow):
         self.timer.stop()
         self.update_playback_ui()
 
-    def playback_finished(self):
+    def playback_finished(self, stream):
+        # A stream replaced by a newer one may report finishing late
+        if stream is not self.stream:
+            return
         self.stop_playback()
         self.playback_position = 0
         if self.playhead_line:
             self.playhead_line.set_xdata([0, 0])
-        self.update_playback_ui()
+            self.blit_overlay()
 
     def sd_callback(self, outdata, frames, time, status):
-        end = min(self.playback_position + frames, len(self.samples))
-        outdata[:end - self.playback_position, 0] = self.samples[self.playback_position:end]
-        if end - self.playback_position < frames:
-            outdata[end - self.playback_position:] = 0
-        self.playback_position = end
+        self.playback_position = fill_output(
+            self.samples, outdata, self.playback_position, frames, self.playback_gain)
         if self.playback_position >= len(self.samples):
+            import sounddevice as sd
             raise sd.CallbackStop()
 
     def update_playback_and_ui(self):
-        current_ms = self.playback_position / self.sample_rate * 1000
+        current_ms = self.playback_position * self.ms_per_sample
         # Update time label
         total_seconds = current_ms / 1000
         minutes = int(total_seconds // 60)
@@ -473,7 +822,7 @@ class WaveformViewer(QMainWindow):
         if self.playhead_line:
             self.playhead_line.set_xdata([current_ms, current_ms])
         else:
-            self.playhead_line = Line2D([current_ms, current_ms], [self.y_min, self.y_max], color='red')
+            self.playhead_line = Line2D([current_ms, current_ms], [self.y_min, self.y_max], color='red', animated=True)
             self.ax.add_line(self.playhead_line)
 
         # --- Find the word to display ---
@@ -481,11 +830,9 @@ class WaveformViewer(QMainWindow):
         words = self.transcription.toPlainText().strip().split()
         
         # Find the marker just before the current playback position
-        left_markers = [m for m in self.markers if m.x <= current_ms]
-        
-        if left_markers:
-            nearest_marker = max(left_markers, key=lambda m: m.x)
-            
+        nearest_marker = self.marker_before(current_ms)
+
+        if nearest_marker is not None:
             # Use the marker's index to find the corresponding word
             # in the transcription list.
             marker_index = nearest_marker.index - 1 # Marker index is 1-based, list is 0-based
@@ -503,23 +850,62 @@ class WaveformViewer(QMainWindow):
             if words and self.add_markers_on_keypress:
                 word_to_display = words[0]
 
-        # Update the word label on the canvas
-        if word_to_display:
-            bidi_word = persian_text(word_to_display)
-            if self.current_word_label is None:
-                self.current_word_label = self.ax.text(
-                    0.5, 0.9, bidi_word, transform=self.ax.transAxes,
-                    ha="center", va="center", fontsize=14,
-                    fontproperties=self.vazir_font,
-                    color="darkred", fontweight="bold", bbox=dict(facecolor="white", alpha=0.6, edgecolor="none")
-                )
+        # Update the word label on the canvas, only when the word changes
+        if word_to_display != self.displayed_word:
+            self.displayed_word = word_to_display
+            if word_to_display:
+                bidi_word = persian_text(word_to_display)
+                if self.current_word_label is None:
+                    self.current_word_label = self.ax.text(
+                        0.5, 0.9, bidi_word, transform=self.ax.transAxes,
+                        ha="center", va="center", fontsize=14,
+                        fontproperties=self.vazir_font,
+                        color="darkred", fontweight="bold", bbox=dict(facecolor="white", alpha=0.6, edgecolor="none"),
+                        animated=True
+                    )
+                else:
+                    self.current_word_label.set_text(bidi_word)
             else:
-                self.current_word_label.set_text(bidi_word)
-        else:
-            if self.current_word_label:
-                self.current_word_label.set_text("")
-                
-        self.canvas.draw_idle()
+                if self.current_word_label:
+                    self.current_word_label.set_text("")
+
+        self.blit_overlay()
+
+        # The stream can end on its own; stop ticking once it has
+        if self.stream is None or not self.stream.active:
+            self.timer.stop()
+
+    def marker_before(self, ms):
+        i = bisect.bisect_right(self._sorted_xs, ms) - 1
+        return self._sorted_markers[i] if i >= 0 else None
+
+    def marker_near(self, x, tolerance):
+        xs = self._sorted_xs
+        i = bisect.bisect_left(xs, x)
+        # Only the neighbours on either side of x can be the closest
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(xs)]
+        if not candidates:
+            return None
+        j = min(candidates, key=lambda j: abs(xs[j] - x))
+        return self._sorted_markers[j] if abs(xs[j] - x) < tolerance else None
+
+    def index_marker(self, marker):
+        i = bisect.bisect_right(self._sorted_xs, marker.x)
+        self._sorted_xs.insert(i, marker.x)
+        self._sorted_markers.insert(i, marker)
+
+    def unindex_marker(self, marker, x):
+        i = bisect.bisect_left(self._sorted_xs, x)
+        if i >= len(self._sorted_markers) or self._sorted_markers[i] is not marker:
+            # Tied positions, or the marker moved mid-drag since it was indexed
+            i = self._sorted_markers.index(marker)
+        del self._sorted_xs[i]
+        del self._sorted_markers[i]
+
+    def move_marker(self, marker, x):
+        self.unindex_marker(marker, marker.x)
+        marker.update_position(x)
+        self.index_marker(marker)
 
     def update_playback_ui(self):
         if self.stream and self.stream.active:
@@ -540,17 +926,22 @@ class WaveformViewer(QMainWindow):
             return
         
         self.clear_markers()
+        self.marker_text = text
         
         self.transcription.setDisabled(True)
         self.submit_button.setDisabled(True)
 
         if not self.add_markers_on_keypress:
-            total_ms = len(self.samples) / self.sample_rate * 1000
-            spacing = total_ms / (len(words) + 1)
+            spacing = self.duration_ms / (len(words) + 1)
             for i, w in enumerate(words):
                 x = spacing * (i + 1)
-                m = Marker(i + 1, w, x, self.y_min, self.y_max, self.ax)
+                m = Marker(i + 1, w, x, self.y_min, self.y_max, self.marker_layer, sync=False)
                 self.markers.append(m)
+            # Push all rows to the collections once instead of per marker
+            self.marker_layer.sync()
+            # Evenly spaced, so word order is already x order
+            self._sorted_markers = list(self.markers)
+            self._sorted_xs = [m.x for m in self.markers]
 
             self.canvas.draw_idle()
         
@@ -558,7 +949,12 @@ class WaveformViewer(QMainWindow):
     def handle_transcription_change(self):
         self.transcription.setDisabled(False)
         self.submit_button.setDisabled(False)
-        self.clear_markers()
+        self.transcription_timer.start()
+
+    def clear_stale_markers(self):
+        # Markers only go stale once the words they were placed for change
+        if self.markers and self.transcription.toPlainText().strip() != self.marker_text:
+            self.clear_markers()
 
     # -------------------------
     # Key press events
@@ -574,7 +970,7 @@ class WaveformViewer(QMainWindow):
                 print("Cannot add marker, playback is paused. Press space to play first.")
                 return
 
-            current_ms = self.playback_position / self.sample_rate * 1000
+            current_ms = self.playback_position * self.ms_per_sample
             words = self.transcription.toPlainText().strip().split()
 
             if self.next_marker_index < len(words):
@@ -582,12 +978,13 @@ class WaveformViewer(QMainWindow):
                 if self.next_marker_index < len(self.markers):
                     # Update existing marker
                     m = self.markers[self.next_marker_index]
-                    m.update_position(current_ms)
+                    self.move_marker(m, current_ms)
                     self.select_marker(m)
                 else:
                     # Add new marker
-                    m = Marker(self.next_marker_index + 1, word, current_ms, self.y_min, self.y_max, self.ax)
+                    m = Marker(self.next_marker_index + 1, word, current_ms, self.y_min, self.y_max, self.marker_layer)
                     self.markers.append(m)
+                    self.index_marker(m)
                     self.select_marker(m)
                 
                 self.next_marker_index += 1
@@ -608,7 +1005,7 @@ class WaveformViewer(QMainWindow):
                 newx_x += step
 
             # update marker position
-            self.selected_marker.update_position(newx_x)
+            self.move_marker(self.selected_marker, newx_x)
             self.canvas.draw_idle()
         else:
             # no marker selected, fall back to other shortcuts (like play/pause on space)
@@ -622,12 +1019,173 @@ class WaveformViewer(QMainWindow):
         return super().eventFilter(obj, event)
 
     def export_markers(self):
-        times = [int(m.x) for m in self.markers]
-        array_str = "[" + ", ".join(map(str, times)) + "]"
+        xs = np.fromiter((m.x for m in self.markers), dtype=np.float64, count=len(self.markers))
+        # Truncate to whole ms like int(); json formats as "[a, b, ...]"
+        array_str = json.dumps(xs.astype(np.int64).tolist())
         clipboard = QApplication.clipboard()
         clipboard.setText(array_str)
         print("Exported:", array_str)
 
+def probe_sample_rate(file_path):
+    """Read the native sample rate of the first audio stream with ffprobe"""
+    out = subprocess.check_output([
+        'ffprobe', '-v', 'quiet', '-select_streams', 'a:0',
+        '-show_entries', 'stream=sample_rate', '-of', 'csv=p=0', file_path
+    ])
+    return int(out.strip())
+
+def decode_mp3(file_path, sample_rate):
+    """Decode an audio file to mono int16 PCM through an ffmpeg pipe"""
+    raw = subprocess.check_output([
+        'ffmpeg', '-v', 'quiet', '-i', file_path,
+        '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), 'pipe:1'
+    ])
+    return np.frombuffer(raw, dtype=np.int16)
+
+def pcm_cache_dir():
+    """Per-user cache directory for decoded PCM; avoids /tmp, which is often RAM-backed"""
+    base = QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation)
+    return os.path.join(base or tempfile.gettempdir(), "mp3-waveform-viewer")
+
+def prune_pcm_cache(cache_dir, keep, budget=PCM_CACHE_BUDGET):
+    """Delete the least recently used cache files until the total fits the budget"""
+    entries = []
+    for path in glob.glob(os.path.join(glob.escape(cache_dir), "*.pcm")):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= budget:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            # Still mapped by this process on Windows; try again next time
+            continue
+        total -= size
+
+def load_pcm(file_path):
+    """Return (pcm, sample_rate), memory-mapping the on-disk cache and decoding on first use"""
+    for tool in ('ffmpeg', 'ffprobe'):
+        if shutil.which(tool) is None:
+            raise FileNotFoundError(f"{tool} not found on PATH; install FFmpeg to decode MP3s")
+    st = os.stat(file_path)
+    key = f"{os.path.abspath(file_path)}|{st.st_size}|{st.st_mtime_ns}"
+    cache_dir = pcm_cache_dir()
+    cache_stem = os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest())
+    # The native sample rate is part of the file name, so cache hits skip ffprobe
+    cached = glob.glob(glob.escape(cache_stem) + "-*.pcm")
+    if cached:
+        cache_path = cached[0]
+        sample_rate = int(cache_path[len(cache_stem) + 1:-len(".pcm")])
+        try:
+            # Mark as recently used so eviction keeps it
+            os.utime(cache_path)
+        except OSError:
+            pass
+    else:
+        sample_rate = probe_sample_rate(file_path)
+        pcm = decode_mp3(file_path, sample_rate)
+        if pcm.size == 0:
+            return pcm, sample_rate
+        cache_path = f"{cache_stem}-{sample_rate}.pcm"
+        # Write under a temporary name so a crash never leaves a truncated cache
+        tmp_path = cache_path + ".tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            pcm.tofile(tmp_path)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            # The cache is only an optimization; play from memory instead
+            print("Could not cache decoded audio:", e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return pcm, sample_rate
+        prune_pcm_cache(cache_dir, keep=cache_path)
+    return np.memmap(cache_path, dtype=np.int16, mode='r'), sample_rate
+
+def grow_rows(buf, capacity):
+    """Return a copy of buf with room for capacity rows along the first axis"""
+    out = np.empty((capacity,) + buf.shape[1:], dtype=buf.dtype)
+    out[:len(buf)] = buf
+    return out
+
+def build_minmax_pyramid(samples, min_len=1024):
+    """Build (mins, maxs) levels where level k holds the extrema of 2**k-sample blocks"""
+    mins = maxs = samples
+    levels = [(mins, maxs)]
+    while len(mins) > min_len:
+        mins, maxs = halve_minmax(mins, maxs)
+        levels.append((mins, maxs))
+    return levels
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def halve_minmax(mins, maxs):
+        """Reduce adjacent pairs of a pyramid level in one fused pass; an odd tail stands alone"""
+        last = len(mins) - 1
+        n = (last + 2) // 2
+        out_min = np.empty(n, mins.dtype)
+        out_max = np.empty(n, maxs.dtype)
+        for i in prange(n):
+            j = min(2 * i + 1, last)
+            out_min[i] = min(mins[2 * i], mins[j])
+            out_max[i] = max(maxs[2 * i], maxs[j])
+        return out_min, out_max
+else:
+    def halve_minmax(mins, maxs):
+        """Reduce adjacent pairs of a pyramid level; an odd tail stands alone"""
+        pairs = len(mins) // 2
+        n = (len(mins) + 1) // 2
+        out_min = np.empty(n, mins.dtype)
+        out_max = np.empty(n, maxs.dtype)
+        np.minimum(mins[0:2 * pairs:2], mins[1:2 * pairs:2], out=out_min[:pairs])
+        np.maximum(maxs[0:2 * pairs:2], maxs[1:2 * pairs:2], out=out_max[:pairs])
+        out_min[pairs:] = mins[2 * pairs:]
+        out_max[pairs:] = maxs[2 * pairs:]
+        return out_min, out_max
+
+if njit is not None:
+    @njit(cache=True)
+    def extrema(x):
+        """Return (min, max) of a non-empty array in one pass"""
+        lo = hi = x[0]
+        for v in x:
+            lo = min(lo, v)
+            hi = max(hi, v)
+        return lo, hi
+else:
+    def extrema(x):
+        """Return (min, max) of a non-empty array"""
+        return x.min(), x.max()
+
+if njit is not None:
+    @njit(cache=True, nogil=True)
+    def fill_output(samples, out, pos, frames, gain):
+        """Copy the next block of samples, scaled by gain, into the int16 output buffer; returns the new position"""
+        n = max(0, min(frames, samples.shape[0] - pos))
+        for i in range(n):
+            out[i, 0] = np.int16(samples[pos + i] * gain)
+        for i in range(n, frames):
+            out[i, 0] = 0
+        return pos + n
+else:
+    def fill_output(samples, out, pos, frames, gain):
+        """Copy the next block of samples, scaled by gain, into the int16 output buffer; returns the new position"""
+        n = max(0, min(frames, len(samples) - pos))
+        np.multiply(samples[pos:pos + n], gain, out=out[:n, 0], casting='unsafe')
+        if n < frames:
+            out[n:].fill(0)
+        return pos + n
+
+@functools.lru_cache(maxsize=4096)
 def persian_text(word: str):
     """Convert plain Persian text to shaped RTL text"""
     reshaped = arabic_reshaper.reshape(word)